@@ -1,9 +1,19 @@
 import json
+import logging
 import os
-from typing import Any, Dict, List, Tuple
+from typing import TYPE_CHECKING, Any, Dict, List, Tuple
 
 from flask import Request
-from google.cloud import discoveryengine_v1beta as discoveryengine
+
+if TYPE_CHECKING:
+    from google.cloud import discoveryengine_v1beta as discoveryengine
+
+logger = logging.getLogger(__name__)
+
+# Discovery Engine quota/overload errors carry one of these HTTP statuses in .code.
+BUSY_STATUS_CODES = {429, 503}
+
+_search_client = None
 
 
 def _json_response(payload: Dict[str, Any], status: int = 200) -> Tuple[str, int, Dict[str, str]]:
@@ -17,7 +27,21 @@ def _build_serving_config(project_id: str, location: str, agent_id: str) -> str:
     )
 
 
-def _extract_citations(results: List[discoveryengine.SearchResponse.SearchResult]) -> List[Dict[str, str]]:
+def _is_truthy(value: str) -> bool:
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _get_search_client() -> "discoveryengine.SearchServiceClient":
+    # discoveryengine pulls in the full gRPC/proto stack, so it is imported on first use.
+    global _search_client
+    if _search_client is None:
+        from google.cloud import discoveryengine_v1beta as discoveryengine
+
+        _search_client = discoveryengine.SearchServiceClient()
+    return _search_client
+
+
+def _extract_citations(results: List["discoveryengine.SearchResponse.SearchResult"]) -> List[Dict[str, str]]:
     citations: List[Dict[str, str]] = []
     for r in results:
         doc = r.document
@@ -27,6 +51,17 @@ def _extract_citations(results: List[discoveryengine.SearchResponse.SearchResult
     return citations
 
 
+def _prewarm() -> None:
+    try:
+        _get_search_client()
+    except Exception:  # noqa: BLE001
+        logger.exception("could not create search client at startup")
+
+
+if _is_truthy(os.environ.get("PREWARM_ON_START") or "false"):
+    _prewarm()
+
+
 def ask_sub_agent(request: Request):
     """HTTP Cloud Function: query a specific Discovery Engine sub-agent and return answer candidates/citations."""
     if request.method != "POST":
@@ -44,14 +79,22 @@ def ask_sub_agent(request: Request):
     if not project_id:
         return _json_response({"error": "missing environment variable: GCP_PROJECT_ID"}, 500)
 
-    client = discoveryengine.SearchServiceClient()
+    from google.cloud import discoveryengine_v1beta as discoveryengine
+
+    client = _get_search_client()
     serving_config = _build_serving_config(project_id, location, agent_id)
     request_obj = discoveryengine.SearchRequest(
         serving_config=serving_config,
         query=question,
         page_size=5,
     )
-    response = client.search(request=request_obj)
+    try:
+        response = client.search(request=request_obj)
+    except Exception as e:  # noqa: BLE001
+        code = getattr(e, "code", None)
+        if isinstance(code, int) and code in BUSY_STATUS_CODES:
+            return _json_response({"error": "upstream busy", "retryable": True, "detail": str(e)}, int(code))
+        raise
 
     snippets = []
     for result in response.results:
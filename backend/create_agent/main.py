@@ -1,15 +1,22 @@
 import datetime
 import json
+import logging
 import os
-from typing import Any, Dict, Tuple
+from typing import TYPE_CHECKING, Any, Dict, Tuple
 
 from flask import Request
-from google.api_core.exceptions import GoogleAPIError
-from google.cloud import discoveryengine_v1beta as discoveryengine
-from google.cloud import firestore
+
+if TYPE_CHECKING:
+    from google.cloud import discoveryengine_v1beta as discoveryengine
+    from google.cloud import firestore
+
+logger = logging.getLogger(__name__)
 
 REGISTRY_COLLECTION = "agents_registry"
 
+_engine_client = None
+_db = None
+
 
 def _json_response(payload: Dict[str, Any], status: int = 200) -> Tuple[str, int, Dict[str, str]]:
     return json.dumps(payload, ensure_ascii=False), status, {"Content-Type": "application/json; charset=utf-8"}
@@ -22,6 +29,49 @@ def _required(data: Dict[str, Any], field: str) -> str:
     return value
 
 
+def _is_truthy(value: str) -> bool:
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _get_engine_client() -> "discoveryengine.EngineServiceClient":
+    global _engine_client
+    if _engine_client is None:
+        from google.cloud import discoveryengine_v1beta as discoveryengine
+
+        _engine_client = discoveryengine.EngineServiceClient()
+    return _engine_client
+
+
+def _get_db(project_id: str) -> "firestore.Client":
+    global _db
+    if _db is None:
+        from google.cloud import firestore
+
+        _db = firestore.Client(project=project_id)
+    return _db
+
+
+def _is_google_api_error(exc: Exception) -> bool:
+    # Only reached once an exception is raised, so api_core (and gRPC) is already loaded by then.
+    from google.api_core.exceptions import GoogleAPIError
+
+    return isinstance(exc, GoogleAPIError)
+
+
+def _prewarm() -> None:
+    try:
+        _get_engine_client()
+        project_id = os.environ.get("GCP_PROJECT_ID")
+        if project_id:
+            _get_db(project_id)
+    except Exception:  # noqa: BLE001
+        logger.exception("could not create Discovery Engine/Firestore clients at startup")
+
+
+if _is_truthy(os.environ.get("PREWARM_ON_START") or "false"):
+    _prewarm()
+
+
 def create_agent(request: Request):
     """HTTP Cloud Function: create Discovery Engine Search app and register metadata in Firestore."""
     if request.method != "POST":
@@ -38,8 +88,10 @@ def create_agent(request: Request):
 
         engine_id = data.get("agent_id") or f"agent-{int(datetime.datetime.now(tz=datetime.timezone.utc).timestamp())}"
 
+        from google.cloud import discoveryengine_v1beta as discoveryengine
+
         # 1) Create Engine (search app)
-        engine_client = discoveryengine.EngineServiceClient()
+        engine_client = _get_engine_client()
         parent = f"projects/{project_id}/locations/{location}/collections/default_collection"
         engine = discoveryengine.Engine(
             display_name=display_name,
@@ -49,7 +101,7 @@ def create_agent(request: Request):
         operation.result(timeout=600)
 
         # 2) Register in Firestore
-        db = firestore.Client(project=project_id)
+        db = _get_db(project_id)
         now = datetime.datetime.now(tz=datetime.timezone.utc)
         doc = {
             "agent_id": engine_id,
@@ -67,7 +119,7 @@ def create_agent(request: Request):
         return _json_response({"error": f"missing environment variable: {e.args[0]}"}, 500)
     except ValueError as e:
         return _json_response({"error": str(e)}, 400)
-    except GoogleAPIError as e:
-        return _json_response({"error": "google api error", "detail": str(e)}, 502)
     except Exception as e:  # noqa: BLE001
+        if _is_google_api_error(e):
+            return _json_response({"error": "google api error", "detail": str(e)}, 502)
         return _json_response({"error": "internal server error", "detail": str(e)}, 500)
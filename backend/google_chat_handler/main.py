@@ -1,7 +1,11 @@
+import itertools
 import json
 import logging
 import os
-from typing import Any, Dict, Tuple
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Tuple
 
 import google.auth.transport.requests
 import google.oauth2.id_token
@@ -10,8 +14,267 @@ from flask import Request
 
 logger = logging.getLogger(__name__)
 
+# Admission decisions are written one JSON object per line to stdout, which Cloud Logging
+# stores as jsonPayload so queue depth, wait time and rejections can back log-based metrics.
+admission_logger = logging.getLogger(f"{__name__}.admission")
+if not admission_logger.handlers:
+    _admission_handler = logging.StreamHandler(sys.stdout)
+    _admission_handler.setFormatter(logging.Formatter("%(message)s"))
+    admission_logger.addHandler(_admission_handler)
+    admission_logger.setLevel(logging.INFO)
+    admission_logger.propagate = False
+
 MASTER_AGENT_URL = os.environ.get("MASTER_AGENT_URL", "")
 
+# Google Chat waits 30 s for a synchronous reply; keep a margin for building the card.
+CHAT_RESPONSE_DEADLINE_SECONDS = 28.0
+
+# Admission control (per instance). Deploy with --concurrency and THREADS of at least
+# ADMISSION_MAX_CONCURRENT + ADMISSION_QUEUE_SIZE for the queue to take effect.
+ADMISSION_MAX_CONCURRENT = int(os.environ.get("ADMISSION_MAX_CONCURRENT", "8"))
+ADMISSION_QUEUE_SIZE = int(os.environ.get("ADMISSION_QUEUE_SIZE", "32"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.environ.get("ADMISSION_MAX_WAIT_SECONDS", "5"))
+ADMISSION_SPACE_RATE_PER_MIN = float(os.environ.get("ADMISSION_SPACE_RATE_PER_MIN", "30"))
+ADMISSION_SPACE_BURST = float(os.environ.get("ADMISSION_SPACE_BURST", "10"))
+ADMISSION_USER_RATE_PER_MIN = float(os.environ.get("ADMISSION_USER_RATE_PER_MIN", "10"))
+ADMISSION_USER_BURST = float(os.environ.get("ADMISSION_USER_BURST", "3"))
+
+# Upstream statuses that mean "overloaded / out of quota" rather than a real failure.
+BUSY_STATUS_CODES = {429, 503}
+
+# Full buckets unused for this long are dropped so the per-key dicts do not grow forever.
+BUCKET_IDLE_SECONDS = 300.0
+
+
+class TokenBucket:
+    """Classic token bucket: `rate` tokens per second, holding at most `burst` tokens."""
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+        self.last_used = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= 1
+
+    def seconds_until(self, count: int, now: float) -> float:
+        """Seconds until `count` tokens will have been available, assuming each is taken on arrival."""
+        self._refill(now)
+        if self.tokens >= count:
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (count - self.tokens) / self.rate
+
+    def is_idle(self, now: float, idle_seconds: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.burst and now - self.last_used >= idle_seconds
+
+    def take(self, now: float) -> None:
+        self._refill(now)
+        self.tokens -= 1
+        self.last_used = now
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "space_key", "user_key", "granted", "evicted")
+
+    def __init__(self, priority: int, seq: int, space_key: str, user_key: str):
+        self.priority = priority
+        self.seq = seq
+        self.space_key = space_key
+        self.user_key = user_key
+        self.granted = False
+        self.evicted = False
+
+
+class AdmissionController:
+    """Limit calls to master_agent with per-space/per-user token buckets and a bounded priority queue.
+
+    A request is admitted when a concurrency slot is free and both its space and user buckets hold a
+    token. Otherwise it waits in a bounded queue for at most `max_wait` seconds. DMs are served first;
+    room messages are ordered behind other queued messages from the same room, so one busy room
+    cannot starve the rest. When the queue is full, a higher-priority arrival evicts the
+    lowest-priority waiter instead of being turned away.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int,
+        queue_size: int,
+        max_wait: float,
+        space_rate_per_min: float,
+        space_burst: float,
+        user_rate_per_min: float,
+        user_burst: float,
+        clock: Callable[[], float] = time.monotonic,
+        poll_interval: float = 0.05,
+    ):
+        self.max_concurrent = max_concurrent
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+        self.space_rate = space_rate_per_min / 60.0
+        self.space_burst = space_burst
+        self.user_rate = user_rate_per_min / 60.0
+        self.user_burst = user_burst
+        self._clock = clock
+        self._poll_interval = poll_interval
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._queue: List[_Waiter] = []
+        self._space_buckets: Dict[str, TokenBucket] = {}
+        self._user_buckets: Dict[str, TokenBucket] = {}
+        self._last_sweep = clock()
+        self._in_flight = 0
+        self._admitted = 0
+        self._rejected = {"queue_full": 0, "rate_limited": 0, "timeout": 0, "evicted": 0}
+        self._wait_ms_total = 0.0
+        self._wait_ms_max = 0.0
+
+    def _bucket(self, buckets: Dict[str, TokenBucket], key: str, rate: float, burst: float, now: float) -> TokenBucket:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = buckets[key] = TokenBucket(rate, burst, now)
+        return bucket
+
+    def _sweep_idle_buckets(self, now: float) -> None:
+        # A full bucket behaves exactly like a new one, so dropping it loses no state.
+        if now - self._last_sweep < BUCKET_IDLE_SECONDS:
+            return
+        self._last_sweep = now
+        for buckets in (self._space_buckets, self._user_buckets):
+            for key in [k for k, b in buckets.items() if b.is_idle(now, BUCKET_IDLE_SECONDS)]:
+                del buckets[key]
+
+    def _buckets_for(self, space_key: str, user_key: str, now: float) -> Tuple[TokenBucket, TokenBucket]:
+        self._sweep_idle_buckets(now)
+        return (
+            self._bucket(self._space_buckets, space_key, self.space_rate, self.space_burst, now),
+            self._bucket(self._user_buckets, user_key, self.user_rate, self.user_burst, now),
+        )
+
+    def _dispatch(self, now: float) -> None:
+        # Grant slots to the highest-priority waiters whose buckets allow it. Caller holds the lock.
+        granted = False
+        for waiter in sorted(self._queue, key=lambda w: (w.priority, w.seq)):
+            if self._in_flight >= self.max_concurrent:
+                break
+            space_bucket, user_bucket = self._buckets_for(waiter.space_key, waiter.user_key, now)
+            if space_bucket.available(now) and user_bucket.available(now):
+                space_bucket.take(now)
+                user_bucket.take(now)
+                self._queue.remove(waiter)
+                self._in_flight += 1
+                waiter.granted = True
+                granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def acquire(self, space_key: str, user_key: str, is_dm: bool) -> Tuple[bool, str, float]:
+        """Wait for a slot. Returns (admitted, reason, wait_ms); call release() after an admitted call."""
+        start = self._clock()
+        with self._cond:
+            # Eligible waiters get free slots first; after that, a request that can run now is admitted
+            # directly and never touches the queue.
+            self._dispatch(start)
+            space_bucket, user_bucket = self._buckets_for(space_key, user_key, start)
+            if (
+                self._in_flight < self.max_concurrent
+                and space_bucket.available(start)
+                and user_bucket.available(start)
+            ):
+                space_bucket.take(start)
+                user_bucket.take(start)
+                self._in_flight += 1
+                self._admitted += 1
+                return True, "admitted", 0.0
+
+            # Waiters already queued on the same bucket take its next tokens first.
+            space_ahead = sum(1 for w in self._queue if w.space_key == space_key)
+            user_ahead = sum(1 for w in self._queue if w.user_key == user_key)
+            refill_wait = max(
+                space_bucket.seconds_until(space_ahead + 1, start),
+                user_bucket.seconds_until(user_ahead + 1, start),
+            )
+            if refill_wait > self.max_wait:
+                self._rejected["rate_limited"] += 1
+                return False, "rate_limited", 0.0
+
+            priority = 0 if is_dm else 1 + space_ahead
+
+            if len(self._queue) >= self.queue_size:
+                victim = max(self._queue, key=lambda w: (w.priority, w.seq)) if self._queue else None
+                if victim is None or victim.priority <= priority:
+                    self._rejected["queue_full"] += 1
+                    return False, "queue_full", 0.0
+                self._queue.remove(victim)
+                victim.evicted = True
+                self._cond.notify_all()
+
+            waiter = _Waiter(priority, next(self._seq), space_key, user_key)
+            self._queue.append(waiter)
+
+            deadline = start + self.max_wait
+            while True:
+                now = self._clock()
+                self._dispatch(now)
+                if waiter.granted:
+                    wait_ms = (now - start) * 1000
+                    self._admitted += 1
+                    self._wait_ms_total += wait_ms
+                    self._wait_ms_max = max(self._wait_ms_max, wait_ms)
+                    return True, "admitted", wait_ms
+                if waiter.evicted:
+                    self._rejected["evicted"] += 1
+                    return False, "evicted", (now - start) * 1000
+                remaining = deadline - now
+                if remaining <= 0:
+                    self._queue.remove(waiter)
+                    self._rejected["timeout"] += 1
+                    return False, "timeout", (now - start) * 1000
+                # Bucket refills are time-based, so poll instead of relying on notify alone.
+                self._cond.wait(timeout=min(remaining, self._poll_interval))
+
+    def release(self) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            self._dispatch(self._clock())
+
+    def gauges(self) -> Dict[str, int]:
+        """Current queue depth and in-flight calls."""
+        with self._cond:
+            return {"queue_depth": len(self._queue), "in_flight": self._in_flight}
+
+    def stats(self) -> Dict[str, Any]:
+        """Cumulative per-instance counters, for local inspection; not exported in logs."""
+        with self._cond:
+            return {
+                "queue_depth": len(self._queue),
+                "in_flight": self._in_flight,
+                "admitted": self._admitted,
+                "rejected": dict(self._rejected),
+                "wait_ms_avg": round(self._wait_ms_total / self._admitted, 1) if self._admitted else 0.0,
+                "wait_ms_max": round(self._wait_ms_max, 1),
+            }
+
+
+_admission = AdmissionController(
+    max_concurrent=ADMISSION_MAX_CONCURRENT,
+    queue_size=ADMISSION_QUEUE_SIZE,
+    max_wait=ADMISSION_MAX_WAIT_SECONDS,
+    space_rate_per_min=ADMISSION_SPACE_RATE_PER_MIN,
+    space_burst=ADMISSION_SPACE_BURST,
+    user_rate_per_min=ADMISSION_USER_RATE_PER_MIN,
+    user_burst=ADMISSION_USER_BURST,
+)
+
 
 def _json_response(payload: Dict[str, Any], status: int = 200) -> Tuple[str, int, Dict[str, str]]:
     return json.dumps(payload, ensure_ascii=False), status, {"Content-Type": "application/json; charset=utf-8"}
@@ -78,13 +341,57 @@ def _build_card_response(master_response: dict) -> dict:
     }
 
 
-def _call_master_agent(text: str) -> dict:
+def _build_busy_response() -> dict:
+    return {
+        "cardsV2": [{
+            "cardId": "busy",
+            "card": {
+                "header": {"title": "\u23f3 混雑しています"},
+                "sections": [{
+                    "widgets": [{"textParagraph": {"text": "現在リクエストが集中しています。しばらくしてから再度お試しください。"}}]
+                }]
+            }
+        }]
+    }
+
+
+def _log_admission(decision: str, wait_ms: float, space_key: str, is_dm: bool) -> None:
+    severity = "INFO" if decision == "admitted" else "WARNING"
+    admission_logger.log(getattr(logging, severity), json.dumps({
+        "severity": severity,
+        "message": f"admission {decision}",
+        "admission": {
+            "decision": decision,
+            "wait_ms": round(wait_ms, 1),
+            "space": space_key,
+            "is_dm": is_dm,
+            **_admission.gauges(),
+        },
+    }, ensure_ascii=False))
+
+
+def _is_busy_error(exc: requests.HTTPError) -> bool:
+    # master_agent marks quota/overload failures with "retryable"; a bare 429/503 comes from the
+    # serving infrastructure itself.
+    resp = exc.response
+    if resp is None:
+        return False
+    try:
+        body = resp.json()
+    except ValueError:
+        body = {}
+    if isinstance(body, dict) and body.get("retryable"):
+        return True
+    return resp.status_code in BUSY_STATUS_CODES
+
+
+def _call_master_agent(text: str, timeout: float) -> dict:
     token = _get_id_token(MASTER_AGENT_URL)
     resp = requests.post(
         MASTER_AGENT_URL,
         json={"question": text},
         headers={"Authorization": f"Bearer {token}"},
-        timeout=30,
+        timeout=timeout,
     )
     resp.raise_for_status()
     return resp.json()
@@ -128,11 +435,36 @@ def google_chat_handler(request: Request):
                 logger.error("MASTER_AGENT_URL is not configured")
                 return {"text": "エラー: MASTER_AGENT_URL が設定されていません。"}
 
+            is_dm = not is_space
+            space_key = (event.get("space", {}) or {}).get("name") or "unknown-space"
+            user_key = (event.get("user", {}) or {}).get("name") or "unknown-user"
+            admitted, decision, wait_ms = _admission.acquire(space_key, user_key, is_dm)
+            if not admitted:
+                _log_admission(decision, wait_ms, space_key, is_dm)
+                return _build_busy_response()
+
+            # The slot must be released whatever happens from here on.
             try:
-                master_response = _call_master_agent(text)
+                _log_admission(decision, wait_ms, space_key, is_dm)
+                # Time spent queued comes out of Google Chat's response deadline.
+                timeout = CHAT_RESPONSE_DEADLINE_SECONDS - wait_ms / 1000
+                if timeout < 1:
+                    return _build_busy_response()
+                master_response = _call_master_agent(text, timeout)
+            except requests.Timeout:
+                logger.warning("master_agent did not answer within the Chat response deadline")
+                return _build_busy_response()
+            except requests.HTTPError as exc:
+                if _is_busy_error(exc):
+                    logger.warning("master_agent overloaded: HTTP %s", exc.response.status_code)
+                    return _build_busy_response()
+                logger.exception("master_agent call failed")
+                return {"text": f"エラーが発生しました: {exc}"}
             except Exception as exc:
                 logger.exception("master_agent call failed")
                 return {"text": f"エラーが発生しました: {exc}"}
+            finally:
+                _admission.release()
 
             return _build_card_response(master_response)
 
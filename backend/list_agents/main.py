@@ -1,16 +1,48 @@
 import json
-from typing import Any, Dict, Tuple
+import logging
+import os
+from typing import TYPE_CHECKING, Any, Dict, Tuple
 
 from flask import Request
-from google.cloud import firestore
+
+if TYPE_CHECKING:
+    from google.cloud import firestore
+
+logger = logging.getLogger(__name__)
 
 REGISTRY_COLLECTION = "agents_registry"
 
+_db = None
+
 
 def _json_response(payload: Dict[str, Any], status: int = 200) -> Tuple[str, int, Dict[str, str]]:
     return json.dumps(payload, ensure_ascii=False), status, {"Content-Type": "application/json; charset=utf-8"}
 
 
+def _is_truthy(value: str) -> bool:
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _get_db() -> "firestore.Client":
+    global _db
+    if _db is None:
+        from google.cloud import firestore
+
+        _db = firestore.Client()
+    return _db
+
+
+def _prewarm() -> None:
+    try:
+        _get_db()
+    except Exception:  # noqa: BLE001
+        logger.exception("could not create Firestore client at startup")
+
+
+if _is_truthy(os.environ.get("PREWARM_ON_START") or "false"):
+    _prewarm()
+
+
 def list_agents(request: Request):
     """HTTP Cloud Function: list available sub-agents from Firestore registry."""
     if request.method not in ("GET", "POST"):
@@ -18,7 +50,7 @@ def list_agents(request: Request):
 
     status_filter = request.args.get("status")
 
-    db = firestore.Client()
+    db = _get_db()
     query = db.collection(REGISTRY_COLLECTION)
     if status_filter:
         query = query.where("status", "==", status_filter)
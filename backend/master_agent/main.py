@@ -10,16 +10,38 @@ from flask import Request
 
 import google.auth.transport.requests
 import google.oauth2.id_token
-import vertexai
-from vertexai.generative_models import GenerativeModel
 
 logger = logging.getLogger(__name__)
 
+# Reused across requests on a warm instance; refreshed only when expired.
+_credentials = None
+
+
+# Upstream statuses that mean "overloaded / out of quota"; callers may retry shortly.
+BUSY_STATUS_CODES = {429, 503}
+
 
 def _json_response(payload: Dict[str, Any], status: int = 200) -> Tuple[str, int, Dict[str, str]]:
     return json.dumps(payload, ensure_ascii=False), status, {"Content-Type": "application/json; charset=utf-8"}
 
 
+def _busy_status(exc: Exception) -> int:
+    """Return 429/503 when exc is an upstream quota or overload error, else 0."""
+    # google.api_core exceptions (ResourceExhausted, ServiceUnavailable) carry the HTTP status in
+    # .code; matching on it avoids importing api_core and the gRPC stack on the cold path.
+    code = getattr(exc, "code", None)
+    if isinstance(code, int) and code in BUSY_STATUS_CODES:
+        return int(code)
+    if isinstance(exc, http_requests.HTTPError) and exc.response is not None:
+        if exc.response.status_code in BUSY_STATUS_CODES:
+            return exc.response.status_code
+    return 0
+
+
+def _busy_response(exc: Exception, status: int) -> Tuple[str, int, Dict[str, str]]:
+    return _json_response({"error": "upstream busy", "retryable": True, "detail": str(exc)}, status)
+
+
 def _required(data: Dict[str, Any], field: str) -> str:
     value = str(data.get(field, "")).strip()
     if not value:
@@ -70,9 +92,12 @@ def _parse_gemini_json(text: str) -> Dict[str, Any]:
 
 
 def _get_access_token() -> str:
-    credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
-    credentials.refresh(google.auth.transport.requests.Request())
-    return credentials.token
+    global _credentials
+    if _credentials is None:
+        _credentials, _ = google.auth.default(scopes=["https://www.googleapis.com/auth/cloud-platform"])
+    if not _credentials.valid:
+        _credentials.refresh(google.auth.transport.requests.Request())
+    return _credentials.token
 
 
 def _is_reasoning_engine_name(value: str) -> bool:
@@ -134,6 +159,10 @@ def _route_with_agent_engine(reasoning_engine_name: str, class_method: str, ques
 
 
 def _route_with_gemini(project_id: str, location: str, question: str, agents: list) -> Dict[str, Any]:
+    # vertexai is heavy to import; load it only when Gemini routing is actually used.
+    import vertexai
+    from vertexai.generative_models import GenerativeModel
+
     prompt = _build_routing_prompt(agents, question)
     vertexai.init(project=project_id, location=location)
     model = GenerativeModel("gemini-2.0-flash")
@@ -141,6 +170,23 @@ def _route_with_gemini(project_id: str, location: str, question: str, agents: li
     return _parse_gemini_json(gemini_response.text)
 
 
+def _prewarm() -> None:
+    """Load clients and tokens at instance start when PREWARM_ON_START is enabled."""
+    routing_mode = (os.environ.get("AGENT_ROUTING_MODE") or "agent_engine_primary").strip().lower()
+    fallback_to_gemini = _is_truthy(os.environ.get("AGENT_ENGINE_FALLBACK_TO_GEMINI") or "false")
+    try:
+        if routing_mode in {"agent_engine_primary", "agent_engine_only"}:
+            _get_access_token()
+        if routing_mode == "gemini" or (routing_mode == "agent_engine_primary" and fallback_to_gemini):
+            import vertexai.generative_models  # noqa: F401
+    except Exception:  # noqa: BLE001
+        logger.exception("prewarm failed; continuing with lazy initialization")
+
+
+if _is_truthy(os.environ.get("PREWARM_ON_START") or "false"):
+    _prewarm()
+
+
 def master_agent(request: Request):
     """HTTP Cloud Function: route user questions to the best sub-agent via Gemini."""
     if request.method != "POST":
@@ -191,6 +237,8 @@ def master_agent(request: Request):
                 if fallback_to_gemini and routing_mode == "agent_engine_primary":
                     logger.exception("agent engine routing failed; falling back to gemini routing")
                     selection = _route_with_gemini(project_id, location, question, agents)
+                elif _busy_status(exc):
+                    raise
                 else:
                     raise ValueError(f"agent engine routing failed: {exc}") from exc
         else:
@@ -243,6 +291,12 @@ def master_agent(request: Request):
     except ValueError as e:
         return _json_response({"error": str(e)}, 400)
     except http_requests.RequestException as e:
+        status = _busy_status(e)
+        if status:
+            return _busy_response(e, status)
         return _json_response({"error": "upstream service error", "detail": str(e)}, 502)
     except Exception as e:  # noqa: BLE001
+        status = _busy_status(e)
+        if status:
+            return _busy_response(e, status)
         return _json_response({"error": "internal server error", "detail": str(e)}, 500)
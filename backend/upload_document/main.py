@@ -1,15 +1,19 @@
 import datetime
 import json
+import logging
 import os
 import pathlib
-from typing import Any, Dict, Tuple
+from typing import TYPE_CHECKING, Any, Dict, Tuple
 
 import google.auth.transport.requests
 import google.oauth2.id_token
 import requests
 from flask import Request
-from google.api_core.exceptions import GoogleAPIError
-from google.cloud import storage
+
+if TYPE_CHECKING:
+    from google.cloud import storage
+
+logger = logging.getLogger(__name__)
 
 ALLOWED_EXTENSIONS = {".pdf", ".txt", ".html", ".csv"}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
@@ -21,6 +25,8 @@ CONTENT_TYPES = {
     ".csv": "text/csv",
 }
 
+_storage_client = None
+
 
 def _json_response(payload: Dict[str, Any], status: int = 200) -> Tuple[str, int, Dict[str, str]]:
     return json.dumps(payload, ensure_ascii=False), status, {"Content-Type": "application/json; charset=utf-8"}
@@ -38,14 +44,44 @@ def _get_id_token(target_url: str) -> str:
     return google.oauth2.id_token.fetch_id_token(auth_req, target_url)
 
 
+def _is_truthy(value: str) -> bool:
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
+def _get_storage_client() -> "storage.Client":
+    global _storage_client
+    if _storage_client is None:
+        from google.cloud import storage
+
+        _storage_client = storage.Client()
+    return _storage_client
+
+
 def _upload_to_gcs(bucket_name: str, blob_path: str, file_data: bytes, content_type: str) -> str:
-    client = storage.Client()
+    client = _get_storage_client()
     bucket = client.bucket(bucket_name)
     blob = bucket.blob(blob_path)
     blob.upload_from_string(file_data, content_type=content_type)
     return f"gs://{bucket_name}/{blob_path}"
 
 
+def _is_google_api_error(exc: Exception) -> bool:
+    from google.api_core.exceptions import GoogleAPIError
+
+    return isinstance(exc, GoogleAPIError)
+
+
+def _prewarm() -> None:
+    try:
+        _get_storage_client()
+    except Exception:  # noqa: BLE001
+        logger.exception("could not create storage client at startup")
+
+
+if _is_truthy(os.environ.get("PREWARM_ON_START") or "false"):
+    _prewarm()
+
+
 def upload_document(request: Request):
     """HTTP Cloud Function: upload a document and create a Discovery Engine agent."""
     if request.method != "POST":
@@ -120,7 +156,9 @@ def upload_document(request: Request):
         return _json_response({"error": f"missing environment variable: {e.args[0]}"}, 500)
     except ValueError as e:
         return _json_response({"error": str(e)}, 400)
-    except (requests.RequestException, GoogleAPIError) as e:
+    except requests.RequestException as e:
         return _json_response({"error": "upstream service error", "detail": str(e)}, 502)
     except Exception as e:  # noqa: BLE001
+        if _is_google_api_error(e):
+            return _json_response({"error": "upstream service error", "detail": str(e)}, 502)
         return _json_response({"error": "internal server error", "detail": str(e)}, 500)
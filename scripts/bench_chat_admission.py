@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+"""Check google_chat_handler's admission control against local fakes.
+
+First, scenarios driven by an injected fake clock check the individual rules:
+idle requests are admitted even with an empty or full queue, rate-limited
+requests are rejected up front, a DM evicts and overtakes queued room
+messages, and queue wait is deducted from the Chat response deadline.
+
+Then the handler's _call_master_agent is replaced by a fake that sleeps for a
+fixed latency, and a burst of mentions from a few busy rooms plus some DMs is
+fired concurrently. Every DM must be answered and the rooms must be shed.
+
+No GCP access is needed. Run it from an environment where
+backend/google_chat_handler/requirements.txt is installed. Exits 1 if any
+check fails.
+
+Usage:
+  python scripts/bench_chat_admission.py [--rooms 3] [--room-messages 20] [--dms 10] [--latency 0.5]
+"""
+import argparse
+import json
+import pathlib
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Tuple
+
+HANDLER_DIR = pathlib.Path(__file__).resolve().parent.parent / "backend" / "google_chat_handler"
+
+
+class _FakeRequest:
+    def __init__(self, event: Dict[str, Any]):
+        self._event = event
+
+    def get_json(self, silent: bool = False) -> Dict[str, Any]:
+        return self._event
+
+
+def _room_event(room: int, user: int) -> Dict[str, Any]:
+    return {
+        "type": "MESSAGE",
+        "space": {"name": f"spaces/room-{room}", "type": "ROOM"},
+        "user": {"name": f"users/room-{room}-user-{user}"},
+        "message": {"text": "@bot VPN がつながらない", "argumentText": "VPN がつながらない"},
+    }
+
+
+def _dm_event(user: int) -> Dict[str, Any]:
+    return {
+        "type": "MESSAGE",
+        "space": {"name": f"spaces/dm-{user}", "type": "DM"},
+        "user": {"name": f"users/dm-user-{user}"},
+        "message": {"text": "VPN がつながらない"},
+    }
+
+
+class _FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _controller(handler: Any, clock: _FakeClock, **overrides: Any) -> Any:
+    params = dict(
+        max_concurrent=4,
+        queue_size=8,
+        max_wait=60.0,
+        space_rate_per_min=600.0,
+        space_burst=100.0,
+        user_rate_per_min=600.0,
+        user_burst=100.0,
+    )
+    params.update(overrides)
+    return handler.AdmissionController(clock=clock, poll_interval=0.01, **params)
+
+
+def _acquire_in_thread(ctrl: Any, results: Dict[str, Tuple], name: str, space: str, user: str, is_dm: bool) -> threading.Thread:
+    t = threading.Thread(target=lambda: results.__setitem__(name, ctrl.acquire(space, user, is_dm)), daemon=True)
+    t.start()
+    return t
+
+
+def _wait_for(predicate: Callable[[], bool], timeout: float = 2.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def _run_scenarios(handler: Any, expect: Callable[[bool, str], None]) -> None:
+    # An idle instance admits directly, even when the queue has no room at all.
+    clock = _FakeClock()
+    ctrl = _controller(handler, clock, queue_size=0)
+    expect(ctrl.acquire("spaces/a", "users/a", False)[:2] == (True, "admitted"), "idle request admitted with queue_size=0")
+
+    # Waiters blocked on their own space buckets must not keep an unrelated room out.
+    clock = _FakeClock()
+    ctrl = _controller(handler, clock, queue_size=2, space_rate_per_min=1, space_burst=1)
+    for space in ("spaces/a", "spaces/b"):
+        ctrl.acquire(space, f"users/{space}-0", False)
+        ctrl.release()
+    results: Dict[str, Tuple] = {}
+    threads = [
+        _acquire_in_thread(ctrl, results, space, space, f"users/{space}-1", False) for space in ("spaces/a", "spaces/b")
+    ]
+    expect(_wait_for(lambda: ctrl.gauges()["queue_depth"] == 2), "bucket-limited rooms queued")
+    expect(ctrl.acquire("spaces/c", "users/c", False)[:2] == (True, "admitted"), "idle room admitted past a full queue")
+    ctrl.release()
+    clock.now += 61
+    for t in threads:
+        t.join(timeout=2)
+    expect(all(results.get(k, (False,))[0] for k in ("spaces/a", "spaces/b")), "queued rooms admitted after refill")
+
+    # A request that cannot get a token within max_wait, counting same-key waiters ahead, is rejected at once.
+    clock = _FakeClock()
+    ctrl = _controller(handler, clock, max_wait=1.5, space_rate_per_min=60, space_burst=1)
+    ctrl.acquire("spaces/a", "users/1", False)
+    results = {}
+    t = _acquire_in_thread(ctrl, results, "second", "spaces/a", "users/2", False)
+    expect(_wait_for(lambda: ctrl.gauges()["queue_depth"] == 1), "second room message queued for its token")
+    expect(ctrl.acquire("spaces/a", "users/3", False)[:2] == (False, "rate_limited"), "third room message rate-limited up front")
+    clock.now += 1.1
+    t.join(timeout=2)
+    expect(results.get("second", (False,))[0], "queued room message admitted after refill")
+
+    # With every slot busy and the queue full, a DM evicts the lowest-priority room message and runs first.
+    clock = _FakeClock()
+    ctrl = _controller(handler, clock, max_concurrent=1, queue_size=2)
+    ctrl.acquire("spaces/busy", "users/holder", False)
+    results = {}
+    threads = []
+    for i in (1, 2):
+        threads.append(_acquire_in_thread(ctrl, results, f"room{i}", "spaces/busy", f"users/r{i}", False))
+        expect(_wait_for(lambda: ctrl.gauges()["queue_depth"] == i), f"room message {i} queued")
+    threads.append(_acquire_in_thread(ctrl, results, "dm", "spaces/dm", "users/d", True))
+    expect(_wait_for(lambda: "room2" in results), "a room message was evicted for the DM")
+    expect(results.get("room2", (None, None))[1] == "evicted", "the newest room message is the one evicted")
+    ctrl.release()
+    expect(_wait_for(lambda: "dm" in results), "DM admitted when the slot frees up")
+    expect("room1" not in results, "DM admitted ahead of the earlier room message")
+    ctrl.release()
+    expect(_wait_for(lambda: "room1" in results), "room message admitted after the DM")
+    ctrl.release()
+    clock.now += 61
+    for t in threads:
+        t.join(timeout=2)
+
+    # Time spent queued is taken out of the Chat deadline; too little left means the busy card.
+    class _FixedWait:
+        def __init__(self, wait_ms: float) -> None:
+            self.wait_ms = wait_ms
+            self.released = 0
+
+        def acquire(self, space_key: str, user_key: str, is_dm: bool) -> Tuple[bool, str, float]:
+            return True, "admitted", self.wait_ms
+
+        def release(self) -> None:
+            self.released += 1
+
+        def gauges(self) -> Dict[str, int]:
+            return {"queue_depth": 0, "in_flight": 0}
+
+    timeouts: List[float] = []
+
+    def recording_master_agent(text: str, timeout: float) -> dict:
+        timeouts.append(timeout)
+        return {"selected_agent": None, "message": "ok"}
+
+    handler._call_master_agent = recording_master_agent
+    for wait_ms, expect_call in ((10_000.0, True), (27_500.0, False)):
+        handler._admission = _FixedWait(wait_ms)
+        timeouts.clear()
+        response = handler.google_chat_handler(_FakeRequest(_dm_event(0)))
+        if expect_call:
+            expect(bool(timeouts) and abs(timeouts[0] - (handler.CHAT_RESPONSE_DEADLINE_SECONDS - 10)) < 1e-6,
+                   "master_agent timeout reduced by the queue wait")
+        else:
+            expect(not timeouts and response.get("cardsV2", [{}])[0].get("cardId") == "busy",
+                   "busy card when the queue wait leaves no time for master_agent")
+        expect(handler._admission.released == 1, f"slot released after a {wait_ms:.0f} ms wait")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rooms", type=int, default=3)
+    parser.add_argument("--room-messages", type=int, default=20, help="mentions per room, each from a distinct user")
+    parser.add_argument("--dms", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.5, help="fake master_agent latency in seconds")
+    parser.add_argument("--max-concurrent", type=int, default=4)
+    parser.add_argument("--queue-size", type=int, default=16)
+    parser.add_argument("--max-wait", type=float, default=2.0)
+    parser.add_argument("--show-logs", action="store_true", help="print the handler's structured admission logs")
+    args = parser.parse_args()
+
+    sys.path.insert(0, str(HANDLER_DIR))
+    import main as handler
+
+    failures: List[str] = []
+
+    def expect(ok: bool, what: str) -> None:
+        print(f"[{'OK' if ok else 'FAIL'}] {what}")
+        if not ok:
+            failures.append(what)
+
+    handler.MASTER_AGENT_URL = "http://fake-master-agent.local"
+    if not args.show_logs:
+        handler._log_admission = lambda *a, **kw: None
+    _run_scenarios(handler, expect)
+
+    handler._admission = "http://fake-master-agent.local"
+    handler._admission = handler.AdmissionController(
+        max_concurrent=args.max_concurrent,
+        queue_size=args.queue_size,
+        max_wait=args.max_wait,
+        space_rate_per_min=handler.ADMISSION_SPACE_RATE_PER_MIN,
+        space_burst=handler.ADMISSION_SPACE_BURST,
+        user_rate_per_min=handler.ADMISSION_USER_RATE_PER_MIN,
+        user_burst=handler.ADMISSION_USER_BURST,
+    )
+
+    def fake_master_agent(text: str, timeout: float) -> dict:
+        time.sleep(args.latency)
+        return {
+            "selected_agent": {"agent_id": "fake", "display_name": "Fake", "reason": "burst test"},
+            "answer_candidates": [f"answer to: {text}"],
+            "citations": [],
+        }
+
+    handler._call_master_agent = fake_master_agent
+
+    # Rooms first, so DMs arrive behind an already saturated queue.
+    events = [("room", _room_event(r, u)) for u in range(args.room_messages) for r in range(args.rooms)]
+    events += [("dm", _dm_event(u)) for u in range(args.dms)]
+
+    outcomes: List[tuple] = []
+    lock = threading.Lock()
+
+    def fire(kind: str, event: Dict[str, Any]) -> None:
+        started = time.perf_counter()
+        response = handler.google_chat_handler(_FakeRequest(event))
+        elapsed = time.perf_counter() - started
+        card_id = (response.get("cardsV2") or [{}])[0].get("cardId", "text")
+        with lock:
+            outcomes.append((kind, "busy" if card_id == "busy" else "answered", elapsed))
+
+    threads = []
+    for kind, event in events:
+        t = threading.Thread(target=fire, args=(kind, event))
+        t.start()
+        threads.append(t)
+        time.sleep(0.002)
+    for t in threads:
+        t.join()
+
+    counts = Counter((kind, result) for kind, result, _ in outcomes)
+    print(f"{'class':<8}{'answered':>10}{'busy':>8}{'max latency s':>16}")
+    for kind in ("dm", "room"):
+        latencies = [e for k, r, e in outcomes if k == kind and r == "answered"]
+        print(
+            f"{kind:<8}{counts[(kind, 'answered')]:>10}{counts[(kind, 'busy')]:>8}"
+            f"{(max(latencies) if latencies else 0):>16.2f}"
+        )
+    print(json.dumps(handler._admission.stats(), ensure_ascii=False), file=sys.stderr)
+
+    expect(counts[("dm", "answered")] == args.dms, "burst: every DM answered")
+    if args.rooms * args.room_messages > args.max_concurrent + args.queue_size:
+        expect(counts[("room", "busy")] > 0, "burst: room overflow shed with the busy card")
+    if failures:
+        print(f"[FAIL] {len(failures)} check(s) failed.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Measure cold-start cost of each Cloud Function in a fresh interpreter.
+
+For every function under backend/ this starts a new Python process, imports
+main.py (import time) and then invokes the entry point once with a minimal
+request (time to first response). Run it from an environment where the
+function's requirements.txt is installed; environment variables such as
+AGENT_ROUTING_MODE or PREWARM_ON_START are passed through, so the measured
+path matches the configuration under test.
+
+Time to first response is only meaningful when the function's environment
+variables and credentials are fully configured: a function that fails fast
+(e.g. 500 on a missing variable) never exercises its real response path.
+Each run therefore records the HTTP status and any exception, and a function
+whose status differs from the expected one is reported as a failure.
+create_agent and upload_document have side effects, so they are deliberately
+timed on their validation path (expected 400) rather than on a real create.
+
+Usage:
+  python scripts/bench_cold_start.py [--runs 5] [--max-import-ms 1500] [--forbid-heavy] [--agent-id <id>] [--json]
+"""
+import argparse
+import json
+import os
+import pathlib
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+BACKEND_DIR = pathlib.Path(__file__).resolve().parent.parent / "backend"
+
+FUNCTIONS = ["create_agent", "list_agents", "ask_sub_agent", "upload_document", "master_agent", "google_chat_handler"]
+
+# "expect" is the status the request must produce; anything else counts as a failure.
+REQUESTS: Dict[str, Dict[str, Any]] = {
+    "create_agent": {"method": "POST", "json": {"display_name": "", "description": "bench", "gcs_source": "gs://dummy/dummy.pdf"}, "expect": 400},
+    "list_agents": {"method": "GET", "expect": 200},
+    "ask_sub_agent": {"method": "POST", "json": {"agent_id": "dummy-agent", "question": "bench"}, "expect": 200},
+    "upload_document": {"method": "POST", "json": {"display_name": "bench", "description": "bench"}, "expect": 400},
+    "master_agent": {"method": "POST", "json": {"question": "bench"}, "expect": 200},
+    "google_chat_handler": {"method": "POST", "json": {"type": "MESSAGE", "message": {"text": "bench"}}, "expect": 200},
+}
+
+# Any of these loaded by `import main` means a lazy import has regressed.
+HEAVY_MODULES = (
+    "vertexai",
+    "google.cloud.firestore",
+    "google.cloud.discoveryengine_v1beta",
+    "google.cloud.storage",
+    "grpc",
+    "google.protobuf",
+)
+
+# Executed in a fresh interpreter so every run pays the full import cost.
+_CHILD = """
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import main
+t1 = time.perf_counter()
+heavy = sorted(m for m in json.loads(sys.argv[4]) if m in sys.modules)
+import flask
+spec = json.loads(sys.argv[3])
+app = flask.Flask("bench")
+status, error = None, None
+with app.test_request_context("/", method=spec["method"], json=spec.get("json")):
+    try:
+        rv = getattr(main, sys.argv[2])(flask.request)
+        status = app.make_response(rv).status_code
+    except Exception as exc:
+        error = repr(exc)
+t2 = time.perf_counter()
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "first_response_ms": (t2 - t1) * 1000, "status": status, "error": error, "heavy_modules": heavy}))
+"""
+
+
+def _run_once(name: str, spec: Dict[str, Any]) -> Dict[str, Any]:
+    proc = subprocess.run(
+        [sys.executable, "-c", _CHILD, str(BACKEND_DIR / name), name, json.dumps(spec), json.dumps(HEAVY_MODULES)],
+        capture_output=True,
+        text=True,
+        timeout=300,
+        env=os.environ.copy(),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _bench(name: str, runs: int, agent_id: str) -> Dict[str, Any]:
+    spec = json.loads(json.dumps(REQUESTS[name]))
+    if name == "ask_sub_agent" and agent_id:
+        spec["json"]["agent_id"] = agent_id
+    samples: List[Dict[str, Any]] = []
+    try:
+        for _ in range(runs):
+            samples.append(_run_once(name, spec))
+    except Exception as exc:  # noqa: BLE001
+        return {"function": name, "error": str(exc)}
+    bad = [s for s in samples if s["error"] or s["status"] != spec["expect"]]
+    last = bad[-1] if bad else samples[-1]
+    return {
+        "function": name,
+        "import_ms": statistics.median(s["import_ms"] for s in samples),
+        "first_response_ms": statistics.median(s["first_response_ms"] for s in samples),
+        "heavy_modules": samples[-1]["heavy_modules"],
+        "status": last["status"],
+        "expected_status": spec["expect"],
+        "handler_error": last["error"],
+        "ok": not bad,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters per function (median is reported)")
+    parser.add_argument("--max-import-ms", type=float, default=None, help="fail if any median import time exceeds this")
+    parser.add_argument("--forbid-heavy", action="store_true", help="fail if any heavy module is loaded at import")
+    parser.add_argument("--agent-id", default="", help="registered agent_id for ask_sub_agent (default: dummy-agent)")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    parser.add_argument("functions", nargs="*", help=f"subset of: {', '.join(FUNCTIONS)} (default: all)")
+    args = parser.parse_args()
+
+    unknown = sorted(set(args.functions) - set(FUNCTIONS))
+    if unknown:
+        parser.error(f"unknown function(s): {', '.join(unknown)}")
+
+    results = [_bench(name, args.runs, args.agent_id) for name in args.functions or FUNCTIONS]
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print(f"{'function':<22}{'import ms':>12}{'1st resp ms':>14}{'status':>8}  heavy modules at import")
+        for r in results:
+            if "error" in r:
+                print(f"{r['function']:<22}{'-':>12}{'-':>14}{'-':>8}  ERROR: {r['error']}")
+                continue
+            heavy = ", ".join(r["heavy_modules"]) or "-"
+            status = "-" if r["status"] is None else str(r["status"])
+            print(f"{r['function']:<22}{r['import_ms']:>12.1f}{r['first_response_ms']:>14.1f}{status:>8}  {heavy}")
+            if not r["ok"]:
+                detail = r["handler_error"] or f"expected HTTP {r['expected_status']}"
+                print(f"{'':<22}  ^ first response not measured on the real path: {detail}")
+
+    failures = [
+        r for r in results
+        if "error" in r
+        or not r["ok"]
+        or (args.max_import_ms is not None and r["import_ms"] > args.max_import_ms)
+        or (args.forbid_heavy and r["heavy_modules"])
+    ]
+    if failures:
+        print(f"[FAIL] {len(failures)} function(s) failed, returned an unexpected status, exceeded the import budget or loaded heavy modules.", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())